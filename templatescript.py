@@ -3,11 +3,17 @@
 import sys
 import os
 import time
+import stat
+import queue
+import gzip
+import shutil
+import argparse
+import atexit
+import functools
 import logging
+import logging.handlers
 import colorlog
-import subprocess
 from datetime import datetime
-from optparse import OptionParser
 
 # Init global variables
 # ----------------------------------------------------------------------------------------------------------------------
@@ -15,19 +21,39 @@ from optparse import OptionParser
 # Save current working directory as root for all relative paths
 CWD = os.getcwd()
 
+# Static process information, looked up once at startup
+USERNAME = os.getenv('USERNAME')
+START_TIME = datetime.now()
+
 # Global logger
 LOGGER = None
 LOGGER_DEFAULT_LEVEL = "info"
 LOGGER_APP_NAME = "AppName"
 LOGGER_DIR = "log"
 LOGGER_NAME = "AppLogger"
+LOGGER_FILE_PREFIX = START_TIME.strftime("%Y-%m-%d_%H%M%S")
+
+# Number of log records buffered in memory before they are written to the log file
+LOGGER_BUFFER_CAPACITY = 1024
+# Size in bytes of the write buffer of the log file
+LOGGER_FILE_BUFFER_SIZE = 64 * 1024
+# Records of this level and higher are written to the log file immediately
+LOGGER_FLUSH_LEVEL = logging.ERROR
+# Maximum size in bytes of the log file and the number of compressed old log files to keep
+LOGGER_FILE_MAX_BYTES = 32 * 1024 * 1024
+LOGGER_FILE_BACKUP_COUNT = 5
 
 # Progress bar
 LINE_WIDTH = 100
+PROGRESSBAR_FILL = '█'
+PROGRESSBAR_REFRESH_INTERVAL = 0.05  # Minimal time in seconds between two redraws of the progress bar
 
 # Yes/No question
 YES = True
 NO = False
+YES_ANSWERS = frozenset(("yes", "y", "ye"))
+NO_ANSWERS = frozenset(("no", "n"))
+YES_NO_PROMPTS = {None: " [y/n] ", "yes": " [Y/n] ", "no": " [y/N] "}
 
 # Function definitions
 # ----------------------------------------------------------------------------------------------------------------------
@@ -35,44 +61,48 @@ NO = False
 # Parse command line agument to options
 def parse_options():
 
-    parser = OptionParser()
+    parser = argparse.ArgumentParser()
 
-    parser.add_option("-l", "--loglevel", 
+    parser.add_argument("-l", "--loglevel", 
                         dest="loglevel", 
                         default=LOGGER_DEFAULT_LEVEL,
                         help=f"Required loglevel, default={LOGGER_DEFAULT_LEVEL}"
-                     )
+                       )
 
-    parser.add_option("-s", "--source", 
+    parser.add_argument("-s", "--source", 
                         dest="source",
                         default="source",
                         help="Source directory, default=source"
-                     )
+                       )
 
-    parser.add_option("-t", "--target", 
+    parser.add_argument("-t", "--target", 
                         dest="target",
                         default="target",
                         help="Target directory, default=target"
-                     )
+                       )
 
-    parser.add_option("-u", "--user", 
+    parser.add_argument("-u", "--user", 
                         dest="username",
-                        default=f"{os.getenv('USERNAME')}",
+                        default=f"{USERNAME}",
                         help="User who runs this script"
-                     )
+                       )
 
-    parser.add_option("-v", "--verbose",
+    parser.add_argument("-v", "--verbose",
                         action="store_true", 
                         dest="verbose", 
                         default=False,
                         help="Enable verbose logging"
-                     )
+                       )
+
+    options = parser.parse_args()
 
-    (options, args) = parser.parse_args()
+    # Convert to absolute path if a relative path was given, relative to the saved working directory
+    options.source      = os.path.normpath(os.path.join(CWD, options.source))
+    options.target      = os.path.normpath(os.path.join(CWD, options.target))
 
-    # Convert to absolute path if a relative path was given
-    options.source      = os.path.abspath(options.source)
-    options.target      = os.path.abspath(options.target)
+    # Check the directories once, the results are reused by the rest of the script
+    options.source_is_dir = os.path.isdir(options.source)
+    options.target_is_dir = os.path.isdir(options.target)
 
     return options
 
@@ -84,6 +114,8 @@ def addLoggingLevel(levelName, levelNum, methodName=None):
     `levelName` becomes an attribute of the `logging` module with the value
     `levelNum`. `methodName` becomes a convenience method 
 
+    Adding a level which is already defined with the same value and method does nothing.
+
     Example
     -------
     >>> addLoggingLevel('TRACE', logging.DEBUG - 5)
@@ -93,6 +125,10 @@ def addLoggingLevel(levelName, levelNum, methodName=None):
     if not methodName:
         methodName = levelName.lower()
 
+    if (logging._nameToLevel.get(levelName) == levelNum and getattr(logging, levelName, None) == levelNum
+            and hasattr(logging.getLoggerClass(), methodName)):
+        return
+
     if hasattr(logging, levelName):
        raise AttributeError('{} already defined in logging module'.format(levelName))
 
@@ -115,19 +151,134 @@ def addLoggingLevel(levelName, levelNum, methodName=None):
     setattr(logging, methodName, logToRoot)
 
 
+# Formatter which adds the milliseconds to the timestamp in the same pass
+class MsecFormatter(logging.Formatter):
+    """
+    Format the timestamp including milliseconds with a single `time.strftime` call.
+
+    The `datefmt` must contain an escaped `%%03d`, which is replaced by the milliseconds of the record.
+    Without it the timestamp is formatted like `logging.Formatter` does.
+    """
+
+    def formatTime(self, record, datefmt=None):
+        if not datefmt or "%%03d" not in datefmt:
+            return super().formatTime(record, datefmt)
+        return time.strftime(datefmt, self.converter(record.created)) % int(record.msecs)
+
+
+# File handler with a large write buffer and size based rotation
+class BufferedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Log to a file which is opened with a large write buffer.
+
+    Records are not flushed one by one but written in chunks of `LOGGER_FILE_BUFFER_SIZE` bytes.
+    Records with level `LOGGER_FLUSH_LEVEL` or higher flush the buffer immediately.
+
+    The file is rotated when it would grow beyond `maxBytes`. The size in bytes is counted by the handler
+    itself, asking the stream for its position would flush the write buffer for every record.
+    """
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, encoding=self.encoding, errors=self.errors,
+                      buffering=LOGGER_FILE_BUFFER_SIZE)
+        self.stream_size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def encoded_size(self, msg):
+        return len(msg.encode(self.encoding or "utf-8", self.errors or "strict"))
+
+    def shouldRollover(self, record, msg_size=None):
+        if self.maxBytes <= 0 or self.stream_size <= 0:
+            return False
+        if msg_size is None:
+            msg_size = self.encoded_size(self.format(record) + self.terminator)
+        if self.stream_size + msg_size < self.maxBytes:
+            return False
+        # Never rotate anything other than regular files
+        return os.path.isfile(self.baseFilename)
+
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            # Format and measure the record once, for both the size check and the write
+            msg = self.format(record) + self.terminator
+            msg_size = self.encoded_size(msg)
+            if self.shouldRollover(record, msg_size):
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self.stream_size += msg_size
+            if record.levelno >= LOGGER_FLUSH_LEVEL:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+# Name of a rotated log file, rotated log files are compressed
+def gzip_namer(name):
+    return name + ".gz"
+
+
+# Compress a rotated log file
+def gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+# Log formatters, shared by all loggers
+LOGGER_PLAIN_FORMATTER = MsecFormatter(
+    "%(asctime)s %(levelname)-8s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S.%%03d"
+    )
+LOGGER_TERMINAL_FORMATTER = logging.Formatter(
+    "%(asctime)s %(levelname)-8s | %(message)s",
+    datefmt='%H:%M:%S'
+    )
+LOGGER_LOG_COLORS = {
+    "ALL"     : "purple",
+    "TRACE"   : "purple",
+    "DEBUG"   : "cyan",
+    "INFO"    : "white",
+    "WARNING" : "yellow",
+    "ERROR"   : "red",
+    "CRITICAL": "bold_red",
+}
+LOGGER_COLOR_FORMATTER = colorlog.ColoredFormatter(
+    "%(log_color)s%(asctime)s %(log_color)s%(levelname)-8s | %(message)s",
+    datefmt='%H:%M:%S',
+    reset=True,
+    log_colors=LOGGER_LOG_COLORS,
+    secondary_log_colors={},
+    style='%'
+)
+
+
 # Create and initialize the logger of this script
 def create_logger(log_dir=LOGGER_DIR, log_file=None, logger_name=LOGGER_NAME, log_level=LOGGER_DEFAULT_LEVEL):
-    """Log plain text to file and to terminal with colors"""
+    """
+    Log plain text to file and to terminal with colors
+
+    The logger is configured once, repeated calls for the same logger name only update its log level.
+    """
 
-    if log_level.upper() not in list(logging._nameToLevel.keys()):
+    if log_level.upper() not in logging._nameToLevel:
         raise AttributeError('{} is not a valid log level name'.format(log_level))
 
     if log_file == None:
-        curr_dateTime = datetime.now().strftime("%Y-%m-%d_%H%M%S")
-        log_file = f'{curr_dateTime}_{LOGGER_APP_NAME}.log'
+        log_file = f'{LOGGER_FILE_PREFIX}_{LOGGER_APP_NAME}.log'
 
     logger = logging.getLogger(logger_name)
 
+    # Already configured by an earlier call, don't add a second set of handlers
+    if logger.handlers:
+        logger.setLevel(log_level.upper())
+        return logger
+
     # Log to file (but not to terminal)
     if log_dir == None:
         log_file_path = log_file
@@ -137,45 +288,104 @@ def create_logger(log_dir=LOGGER_DIR, log_file=None, logger_name=LOGGER_NAME, lo
     else:
         log_file_path = os.path.join(log_dir, log_file)
 
-    logfile_handler = logging.FileHandler(log_file_path)
-    plain_formatter = logging.Formatter(
-        "%(asctime)s.%(msecs)03d %(levelname)-8s | %(message)s", 
-        datefmt="%Y-%m-%d %H:%M:%S"
+    logfile_handler = BufferedFileHandler(
+        log_file_path,
+        maxBytes=LOGGER_FILE_MAX_BYTES,
+        backupCount=LOGGER_FILE_BACKUP_COUNT,
+        encoding="utf-8"
         )
-    logfile_handler.setFormatter(plain_formatter)  
-
-
-    # Logging info level to stdout with colors
-    terminal_handler = colorlog.StreamHandler()
-    color_formatter = colorlog.ColoredFormatter(
-        "%(log_color)s%(asctime)s %(log_color)s%(levelname)-8s | %(message)s",
-        datefmt='%H:%M:%S',
-        reset=True,
-        log_colors={
-            "ALL"     : "purple",
-            "TRACE"   : "purple",
-            "DEBUG"   : "cyan",
-            "INFO"    : "white",
-            "WARNING" : "yellow",
-            "ERROR"   : "red",
-            "CRITICAL": "bold_red",
-        },
-        secondary_log_colors={},
-        style='%'
-    )
-    terminal_handler.setFormatter(color_formatter)
-
-    logger.setLevel(log_level)
+    logfile_handler.namer = gzip_namer
+    logfile_handler.rotator = gzip_rotator
+    logfile_handler.setFormatter(LOGGER_PLAIN_FORMATTER)
+
+    # Buffer file records in memory and write them in batches, errors are flushed immediately
+    memory_handler = logging.handlers.MemoryHandler(
+        LOGGER_BUFFER_CAPACITY,
+        flushLevel=LOGGER_FLUSH_LEVEL,
+        target=logfile_handler,
+        flushOnClose=True
+        )
+    # Close the memory handler first so its records are drained into the file before it is closed
+    atexit.register(logfile_handler.close)
+    atexit.register(memory_handler.close)
+
+    # Logging info level to the terminal, with colors only if it is an interactive terminal
+    terminal_handler = logging.StreamHandler()
+    if terminal_handler.stream.isatty():
+        terminal_handler.setFormatter(LOGGER_COLOR_FORMATTER)
+    else:
+        terminal_handler.setFormatter(LOGGER_TERMINAL_FORMATTER)
+
+    logger.setLevel(log_level.upper())
+
+    # Only queue the records on the logging thread, the handlers are run by a background thread
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.listener = logging.handlers.QueueListener(
+        log_queue,
+        memory_handler,
+        terminal_handler,
+        respect_handler_level=True
+        )
+    queue_handler.listener.start()
+    # Stop the listener first so all queued records are handled before the handlers are closed
+    atexit.register(queue_handler.listener.stop)
 
     # Add handlers to logger
-    logger.addHandler(logfile_handler)
-    logger.addHandler(terminal_handler)
+    logger.addHandler(queue_handler)
     
     return logger
 
 
+# Wait until all queued records of a logger are handled
+def wait_for_logger(logger):
+    for handler in logger.handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            handler.queue.join()
+
+
+# Create a progress bar drawing function for a fixed layout
+@functools.lru_cache(maxsize=32)
+def make_progressbar(prefix = '', suffix = '', decimals = 1, length = 82, fill = PROGRESSBAR_FILL, printEnd = "\r"):
+    """
+    Return a function `draw(iteration, total)` which prints the progress bar with the given layout
+    @params:
+        prefix      - Optional  : prefix string (Str)
+        suffix      - Optional  : suffix string (Str)
+        decimals    - Optional  : positive number of decimals in percent complete (Int)
+        length      - Optional  : character length of bar (Int)
+        fill        - Optional  : bar fill character (Str)
+        printEnd    - Optional  : end character (e.g. "\r", "\r\n") (Str)
+
+    Intermediate iterations are only drawn when at least PROGRESSBAR_REFRESH_INTERVAL seconds
+    have passed since the previous draw of this layout, the first and the last iteration are always drawn.
+    """
+    if len(prefix) < 1:
+        prefix = "                 "
+    full = fill * length
+    empty = '-' * length
+    fmt_pct = f"{{:.{decimals}f}}"
+    monotonic = time.monotonic
+    last_draw = 0.0
+
+    def draw(iteration, total):
+        nonlocal last_draw
+        now = monotonic()
+        if 0 < iteration < total and now - last_draw < PROGRESSBAR_REFRESH_INTERVAL:
+            return
+        last_draw = now
+
+        filledLength = int(length * iteration // total)
+        # Print New Line on Complete
+        end = printEnd + '\n' if iteration == total else printEnd
+        sys.stdout.write(f'\r{prefix} |{full[:filledLength]}{empty[filledLength:]}| {fmt_pct.format(100 * iteration / total)}% {suffix}{end}')
+        sys.stdout.flush()
+
+    return draw
+
+
 # Print iterations progress
-def print_progressbar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 82, fill = '█', printEnd = "\r"):
+def print_progressbar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 82, fill = PROGRESSBAR_FILL, printEnd = "\r"):
     """
     Call in a loop to create terminal progress bar
     @params:
@@ -187,16 +397,20 @@ def print_progressbar (iteration, total, prefix = '', suffix = '', decimals = 1,
         length      - Optional  : character length of bar (Int)
         fill        - Optional  : bar fill character (Str)
         printEnd    - Optional  : end character (e.g. "\r", "\r\n") (Str)
+
+    In loops it is faster to get the drawing function once with make_progressbar() and call that.
     """
-    if len(prefix) < 1:
-        prefix = "                 "
-    percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
-    filledLength = int(length * iteration // total)
-    bar = fill * filledLength + '-' * (length - filledLength)
-    print(f'\r{prefix} |{bar}| {percent}% {suffix}', end = printEnd)
-    # Print New Line on Complete
-    if iteration == total: 
-        print()
+    make_progressbar(prefix, suffix, decimals, length, fill, printEnd)(iteration, total)
+
+
+# List the content of a directory, similar to 'ls -al'
+def list_directory(path):
+    """Return one line with mode, size and name per entry of the directory `path`, sorted by name"""
+    lines = []
+    for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+        entry_stat = entry.stat(follow_symlinks=False)
+        lines.append(f"{stat.filemode(entry_stat.st_mode)} {entry_stat.st_size:>8} {entry.name}")
+    return "\n".join(lines)
 
 
 # Ask a Yes-No question and handle the user input
@@ -210,23 +424,19 @@ def query_yes_no(question, default="yes"):
 
     The "answer" return value is True for "yes" or False for "no".
     """
-    valid = {"yes": True, "y": True, "ye": True, "no": False, "n": False}
-    if default is None:
-        prompt = " [y/n] "
-    elif default == "yes":
-        prompt = " [Y/n] "
-    elif default == "no":
-        prompt = " [y/N] "
-    else:
+    if default not in YES_NO_PROMPTS:
         raise ValueError("invalid default answer: '%s'" % default)
+    prompt = YES_NO_PROMPTS[default]
 
     while True:
         sys.stdout.write(question + prompt)
         choice = input().lower()
         if default is not None and choice == "":
-            return valid[default]
-        elif choice in valid:
-            return valid[choice]
+            return default == "yes"
+        elif choice in YES_ANSWERS:
+            return True
+        elif choice in NO_ANSWERS:
+            return False
         else:
             sys.stdout.write("Please respond with 'yes' or 'no' " "(or 'y' or 'n').\n")
 
@@ -234,29 +444,35 @@ def query_yes_no(question, default="yes"):
 # Main function of the script controlling the flow
 def main(options):
 
-    LOGGER.info("------------------------------==========  <NAME>  ==========-----------------------------")
-    LOGGER.info(f"Date Time      : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    LOGGER.info(f"User name      : {options.username}")
-    LOGGER.info(f"Working dir    : {CWD}")
-    LOGGER.info(f"Source dir     : {options.source}")
-    LOGGER.info(f"Target dir     : {options.target}")
-    LOGGER.info(f"Log level      : {logging.getLevelName(LOGGER.level)}")
-    LOGGER.info(f"Verbose mode   : {options.verbose}")
-    LOGGER.info("-----------------------------------------------------------------------------------------")
-
-    if options.source is None or not os.path.isdir(options.source):
-        LOGGER.critical(f"Given source dir '{options.source}' doesn't exist or is not a directory...")
+    # Bind the most used logger methods to local names to avoid repeated attribute lookups
+    info, debug, warning, critical = LOGGER.info, LOGGER.debug, LOGGER.warning, LOGGER.critical
+
+    date_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    info("------------------------------==========  <NAME>  ==========-----------------------------")
+    info("Date Time      : %s", date_time)
+    info("User name      : %s", options.username)
+    info("Working dir    : %s", CWD)
+    info("Source dir     : %s", options.source)
+    info("Target dir     : %s", options.target)
+    info("Log level      : %s", logging.getLevelName(LOGGER.level))
+    info("Verbose mode   : %s", options.verbose)
+    info("-----------------------------------------------------------------------------------------")
+
+    if not options.source_is_dir:
+        critical("Given source dir '%s' doesn't exist or is not a directory...", options.source)
         # sys.exit(0)
 
-    if options.target is None or not os.path.isdir(options.target):
-        LOGGER.critical(f"Given target dir '{options.target}' doesn't exist or is not a directory...")
+    if not options.target_is_dir:
+        critical("Given target dir '%s' doesn't exist or is not a directory...", options.target)
         # sys.exit(0)
 
-    LOGGER.info("- Action 1: Test all log levels ---------------------------------------------------------")
+    info("- Action 1: Test all log levels ---------------------------------------------------------")
     current_loglevel = LOGGER.level
     LOGGER.setLevel(logging.ALL)  # Overwrite loglevel to always print all levels in this test
 
-    print(f"All log levels: {list(logging._nameToLevel.keys())}")
+    wait_for_logger(LOGGER)  # Show all log output before printing to stdout
+    print(f"All log levels: {list(logging._nameToLevel)}")
 
     LOGGER.all("All message")
     LOGGER.trace("Trace message")
@@ -269,29 +485,31 @@ def main(options):
     
     LOGGER.setLevel(current_loglevel)  # Restore original log level
 
-    LOGGER.info("- Action 2: Progress bar ----------------------------------------------------------------")
+    info("- Action 2: Progress bar ----------------------------------------------------------------")
     idx = 0
-    max = 7 # example value for max items
+    max = 700 # example value for max items
 
+    wait_for_logger(LOGGER)  # Show all log output before the progress bar is drawn
+    progressbar, sleep = make_progressbar(), time.sleep
     for idx in range(max):
-        print_progressbar(idx, max-1)
-        time.sleep(1)   
-    LOGGER.debug(f"Latest Idx: {idx}")    
+        progressbar(idx, max-1)
+        sleep(0.01)  # example work per item
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        debug("Latest Idx: %s", idx)
 
     if options.verbose:
-        LOGGER.info(f"  - Verbose text")    
+        info("  - Verbose text")
     
-    LOGGER.info("- Action 3: Yes / No question ---------------------------------------------------------------")    
+    info("- Action 3: Yes / No question ---------------------------------------------------------------")    
     
+    wait_for_logger(LOGGER)  # Show all log output before the question is asked
     if query_yes_no("  Question with a yes/no answer?.", "yes") == YES:
-        LOGGER.warning(f"  - Answer: Yes")
+        warning("  - Answer: Yes")
     else: 
-        LOGGER.fatal(f"  - Answer: No") 
+        LOGGER.fatal("  - Answer: No") 
         
-    LOGGER.info("- Action 4: Command line action -------------------------------------------------------------") 
-    cmd = ['ls', '-al']
-    output = subprocess.check_output(cmd, cwd=CWD).decode('utf8')
-    LOGGER.info(f"  - ls -al:\n{output}")
+    info("- Action 4: Directory listing ---------------------------------------------------------------") 
+    info("  - %s:\n%s", CWD, list_directory(CWD))
 
 # -------------------------------------------------------------------------------------------------
 # MAIN
@@ -307,4 +525,5 @@ if __name__ == "__main__":
 
     main(options)
 
+    wait_for_logger(LOGGER)  # Show all log output before printing to stdout
     print(f"The END...")
\ No newline at end of file
@@ -1,8 +1,26 @@
 import unittest
+import atexit
 import logging
+import os
+import tempfile
+import time
+import io
+import contextlib
+import gzip
 
 from templatescript import *
 
+def close_handlers(logger):
+    for queue_handler in logger.handlers:
+        atexit.unregister(queue_handler.listener.stop)
+        queue_handler.listener.stop()
+        for handler in queue_handler.listener.handlers:
+            target = getattr(handler, "target", None)
+            handler.close()
+            if target is not None:
+                target.close()
+        queue_handler.close()
+
 class TestLogger(unittest.TestCase):
 
     def setUp(self):
@@ -11,4 +29,160 @@ class TestLogger(unittest.TestCase):
     def test_add_new_loglevel(self):
         assert "TRACE" not in list(logging._nameToLevel.keys())
         addLoggingLevel("TRACE", logging.DEBUG - 5)
-        assert "TRACE" in list(logging._nameToLevel.keys())
\ No newline at end of file
+        assert "TRACE" in list(logging._nameToLevel.keys())
+
+    def test_logfile_is_buffered_until_error(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = create_logger(log_dir=log_dir, log_file="test.log", logger_name="BufferedLogger", log_level="INFO")
+            log_file_path = os.path.join(log_dir, "test.log")
+
+            logger.info("Info message")
+            wait_for_logger(logger)
+            assert os.path.getsize(log_file_path) == 0
+
+            logger.error("Error message")
+            wait_for_logger(logger)
+            assert os.path.getsize(log_file_path) > 0
+
+            close_handlers(logger)
+
+    def test_add_existing_loglevel(self):
+        addLoggingLevel("VERBOSE", logging.DEBUG + 5)
+        addLoggingLevel("VERBOSE", logging.DEBUG + 5)
+        assert logging.getLevelName("VERBOSE") == logging.DEBUG + 5
+
+        with self.assertRaises(AttributeError):
+            addLoggingLevel("VERBOSE", logging.DEBUG + 5, "verb")
+
+    def test_create_logger_twice(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = create_logger(log_dir=log_dir, log_file="test.log", logger_name="CachedLogger", log_level="INFO")
+            handlers = list(logger.handlers)
+
+            assert create_logger(log_dir=log_dir, log_file="test.log", logger_name="CachedLogger", log_level="INFO") is logger
+            assert logger.handlers == handlers
+
+            assert create_logger(log_dir, "test.log", "CachedLogger", "debug") is logger
+            assert logger.handlers == handlers
+            assert logger.level == logging.DEBUG
+
+            create_logger(log_dir=log_dir, log_file="test.log", logger_name="CachedLogger", log_level="INFO")
+            assert logger.level == logging.INFO
+
+            close_handlers(logger)
+
+    def test_list_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, "b_dir"))
+            with open(os.path.join(directory, "a_file"), "w") as file:
+                file.write("12345")
+
+            lines = list_directory(directory).splitlines()
+
+            assert len(lines) == 2
+            assert lines[0].startswith("-") and lines[0].endswith("       5 a_file")
+            assert lines[1].startswith("d") and lines[1].endswith(" b_dir")
+
+    def test_progressbar_skips_fast_redraws(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for idx in range(1000):
+                print_progressbar(idx, 999)
+
+        frames = output.getvalue().split("\r")
+        assert "0.0%" in frames[1]
+        assert "100.0%" in frames[-2]
+        assert len(frames) < 1000
+
+    def test_logfile_rotation_is_compressed(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file_path = os.path.join(log_dir, "test.log")
+            handler = BufferedFileHandler(log_file_path, maxBytes=100, backupCount=2)
+            handler.namer = gzip_namer
+            handler.rotator = gzip_rotator
+
+            for idx in range(5):
+                handler.emit(logging.makeLogRecord({"msg": f"Message {idx} " + "x" * 50, "levelno": logging.INFO}))
+            handler.close()
+
+            assert sorted(os.listdir(log_dir)) == ["test.log", "test.log.1.gz", "test.log.2.gz"]
+            with gzip.open(log_file_path + ".1.gz", "rt") as file:
+                assert file.read().startswith("Message 3")
+            with open(log_file_path) as file:
+                assert file.read().startswith("Message 4")
+
+    def test_logfile_rotation_counts_bytes(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file_path = os.path.join(log_dir, "test.log")
+            handler = BufferedFileHandler(log_file_path, maxBytes=1000, backupCount=5, encoding="utf-8")
+
+            for idx in range(10):
+                handler.emit(logging.makeLogRecord({"msg": "█" * 90, "levelno": logging.INFO}))
+            handler.close()
+
+            log_files = os.listdir(log_dir)
+            assert len(log_files) > 1
+            for log_file in log_files:
+                assert os.path.getsize(os.path.join(log_dir, log_file)) <= 1000
+
+    def test_logfile_formats_record_once(self):
+        format_calls = []
+
+        class CountingFormatter(logging.Formatter):
+            def format(self, record):
+                format_calls.append(record)
+                return super().format(record)
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            handler = BufferedFileHandler(os.path.join(log_dir, "test.log"), maxBytes=100, backupCount=2)
+            handler.setFormatter(CountingFormatter())
+
+            for idx in range(10):
+                handler.emit(logging.makeLogRecord({"msg": f"Message {idx}", "levelno": logging.INFO}))
+            handler.close()
+
+        assert len(format_calls) == 10
+
+    def test_make_progressbar_is_cached(self):
+        assert make_progressbar(length=10) is make_progressbar(length=10)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            make_progressbar(length=10)(1, 2)
+            make_progressbar(length=10)(2, 2)
+
+        assert output.getvalue().endswith("|██████████| 100.0% \r\n")
+
+    def test_progressbar_float_iteration(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            print_progressbar(0.5, 1, length=12)
+
+        assert "|██████------| 50.0%" in output.getvalue()
+
+    def test_msec_formatter(self):
+        record = logging.makeLogRecord({"msg": "Message", "created": 0.042, "msecs": 42.0})
+
+        formatter = MsecFormatter("%(asctime)s %(message)s", datefmt="%H:%M:%S.%%03d")
+        assert formatter.format(record).endswith(".042 Message")
+
+        for formatter in (MsecFormatter("%(asctime)s %(message)s"),
+                          MsecFormatter("%(asctime)s %(message)s", datefmt="%H:%M:%S")):
+            assert formatter.format(record) == logging.Formatter(formatter._fmt, formatter.datefmt).format(record)
+
+    def test_msec_formatter_uses_class_converter(self):
+        record = logging.makeLogRecord({"msg": "Message", "created": 0.042, "msecs": 42.0})
+
+        class UtcFormatter(MsecFormatter):
+            converter = time.gmtime
+
+        formatter = UtcFormatter("%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S.%%03d")
+        assert formatter.format(record) == "1970-01-01 00:00:00.042 Message"
+
+    def test_progressbar_layouts_throttle_separately(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            make_progressbar(length=14)(1, 2)
+            make_progressbar(length=16)(1, 2)
+
+        assert output.getvalue().count("50.0%") == 2